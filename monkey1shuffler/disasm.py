@@ -1454,28 +1454,34 @@ def instr_list_to_bytes(instrs: list[tuple[int, V4Instr]]) -> bytes:
     # - create new offsets list based on code size
     pos = instrs[0][0]
     old_bases = [x for x, _ in instrs]
+    # map each old offset to the first instruction at it, same as old_bases.index()
+    old_base_idx: dict[int, int] = {}
+    for i, x in enumerate(old_bases):
+        old_base_idx.setdefault(x, i)
     # print(f"Old bases: {old_bases}")
+    # encode everything once up front; only jumps need encoding again
+    encoded = [v4_instr_to_bytes(instr) for _, instr in instrs]
     new_bases = []
-    for off, instr in instrs:
+    for code in encoded:
         new_bases.append(pos)
-        pos += len(v4_instr_to_bytes(instr))
+        pos += len(code)
     # print(f"New bases: {new_bases}")
     for i, (off, instr) in enumerate(instrs):
         # print((off, instr))
         if "offset" in instr.args:
             # filter nops
             if instr.name == "jumpRelative" and instr.args["offset"] == 0:
-                result.extend(v4_instr_to_bytes(instr))
+                result.extend(encoded[i])
                 continue
-            target = off + len(v4_instr_to_bytes(instr)) + instr.args["offset"]
-            target_idx = old_bases.index(target)
+            target = off + len(encoded[i]) + instr.args["offset"]
+            target_idx = old_base_idx[target]
 
             offset_old = instr.args["offset"]
             instr.args["offset"] = new_bases[target_idx] - len(instr.raw) - new_bases[i]
             result.extend(v4_instr_to_bytes(instr))
             instr.args["offset"] = offset_old
         else:
-            result.extend(v4_instr_to_bytes(instr))
+            result.extend(encoded[i])
 
     return bytes(result)
 
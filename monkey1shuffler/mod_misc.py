@@ -9,7 +9,7 @@ from .resources import (
     IGameData,
     get_global_model,
     get_object_model,
-    update_global_model,
+    mark_global_dirty,
     update_local_model,
     update_object_model,
 )
@@ -34,7 +34,7 @@ def add_version_tag(archives: dict[str, Any], scripts: IGameData, random_seed: i
                     data=f"MI1S v{__version__} seed #{random_seed}".encode("ascii"),
                 )
             )
-    update_global_model(archives, scripts, 10, 149)
+    mark_global_dirty(scripts, 10, 149)
 
 
 def test_mod_intro(archives: dict[str, Any], scripts: IGameData):
@@ -124,7 +124,7 @@ def debug_mode(archives: dict[str, Any], content: IGameData):
     script.insert(
         0, (0, V4Instr(0x19, "move", args={"value": 1}, target=V4Var(39, None)))
     )  # VAR_DEBUGMODE
-    update_global_model(archives, content, 10, 1)
+    mark_global_dirty(content, 10, 1)
     # print("After:")
     # scumm_v4_tokenizer(script_model.data, print_data=True)
 
@@ -140,6 +140,7 @@ def turbo_mode(archives: dict[str, Any], content: IGameData, timer_interval: int
                 and isinstance(instr.target, V4Var)
                 and instr.target.id == 19
                 and isinstance(instr.args["value"], int)
+                and instr.args["value"] != timer_interval
             ):
                 instr.args["value"] = timer_interval
                 modded = True
@@ -148,7 +149,7 @@ def turbo_mode(archives: dict[str, Any], content: IGameData, timer_interval: int
     for room_id, room in content.items():
         for global_id, glob in room["globals"].items():
             if mod_script(glob["script"]):
-                update_global_model(archives, content, room_id, global_id)
+                mark_global_dirty(content, room_id, global_id)
 
         for local_id, local in room["locals"].items():
             if mod_script(local["script"]):
@@ -163,4 +164,4 @@ def skip_code_wheel(archives: dict[str, Any], content: IGameData):
             del script[i : i + 4]
             break
         i += 1
-    update_global_model(archives, content, 10, 1)
+    mark_global_dirty(content, 10, 1)
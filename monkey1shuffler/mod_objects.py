@@ -3,15 +3,17 @@ from collections import defaultdict
 from typing import Any
 
 from .disasm import V4Var, V4Instr
-from .resources import IGameData, update_global_model
+from .resources import IGameData, mark_global_dirty
 
 def find_pick_up_object(instr_list: list[tuple[int, V4Instr]]):
     result = []
+    ego = V4Var(1, None)
     for off, x in instr_list:
-        if x.name == "pickupObject":
-            result.append({"offset": off, "op": "pickupObject", "obj": x.args["obj"]})
-        elif x.name == "setOwner" and x.args["owner"] == V4Var(1, None):
-            result.append({"offset": off, "op": "setOwner", "obj": x.args["obj"]})
+        name = x.name
+        if name == "pickupObject":
+            result.append({"offset": off, "op": name, "obj": x.args["obj"]})
+        elif name == "setOwner" and x.args["owner"] == ego:
+            result.append({"offset": off, "op": name, "obj": x.args["obj"]})
     return result
 
 
@@ -67,5 +69,5 @@ def shuffle_objects(archives: dict[str, Any], content: IGameData):
             script[i+1:i+1] = [(script[i][0], m) for m in room_mod]
             break
         i += 1
-    update_global_model(archives, content, 10, 1) 
+    mark_global_dirty(content, 10, 1) 
     
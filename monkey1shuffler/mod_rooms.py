@@ -19,8 +19,8 @@ from .resources import (
     dump_all,
     get_object_model,
     get_room_names,
+    mark_global_dirty,
     update_entry_model,
-    update_global_model,
     update_local_model,
     update_object_model,
 )
@@ -32,162 +32,181 @@ from .resources import (
 # - 37 is inside meathook's house
 # - 60 is inside smirk's gym
 #
-MI1EGA_ROOM_CLASS: dict[str, set[int]] = {
-    "card": {90, 96, 10, 97, 98, 95, 94},
-    "map": {63, 85, 2, 3, 4, 5, 6},
-    "outdoors": {
-        38,
-        33,
-        61,
-        35,
-        32,
-        34,
-        57,
-        36,
-        59,
-        58,
-        43,
-        52,
-        48,
-        64,
-        15,
-        19,
-        17,
-        12,
-        69,
-        21,
-        18,
-        11,
-        16,
-        40,
-        25,
-        80,
-    },
-    "indoors": {
-        28,
-        41,
-        29,
-        53,
-        31,
-        30,
-        78,
-        7,
-        8,
-        9,
-        14,
-        65,
-        70,
-        39,
-        71,
-        72,
-        73,
-        74,
-        75,
-        77,
-        27,
-    },
-    "closeup": {
-        44,
-        83,
-        42,
-        79,
-        82,
-        81,
-        23,
-        45,
-        89,
-        62,
-        49,
-        60,
-        76,
-        88,
-        51,
-        37,
-        50,
-        84,
-        87,
-        86,
-    },
-    "beach": {20, 1},
+MI1EGA_ROOM_CLASS: dict[str, frozenset[int]] = {
+    "card": frozenset({90, 96, 10, 97, 98, 95, 94}),
+    "map": frozenset({63, 85, 2, 3, 4, 5, 6}),
+    "outdoors": frozenset(
+        {
+            38,
+            33,
+            61,
+            35,
+            32,
+            34,
+            57,
+            36,
+            59,
+            58,
+            43,
+            52,
+            48,
+            64,
+            15,
+            19,
+            17,
+            12,
+            69,
+            21,
+            18,
+            11,
+            16,
+            40,
+            25,
+            80,
+        }
+    ),
+    "indoors": frozenset(
+        {
+            28,
+            41,
+            29,
+            53,
+            31,
+            30,
+            78,
+            7,
+            8,
+            9,
+            14,
+            65,
+            70,
+            39,
+            71,
+            72,
+            73,
+            74,
+            75,
+            77,
+            27,
+        }
+    ),
+    "closeup": frozenset(
+        {
+            44,
+            83,
+            42,
+            79,
+            82,
+            81,
+            23,
+            45,
+            89,
+            62,
+            49,
+            60,
+            76,
+            88,
+            51,
+            37,
+            50,
+            84,
+            87,
+            86,
+        }
+    ),
+    "beach": frozenset({20, 1}),
 }
-MI1EGA_ROOM_CLUSTER: dict[str, set[int]] = {
-    "melee": {
-        63,
-        85,
-        38,
-        33,
-        61,
-        35,
-        32,
-        34,
-        57,
-        36,
-        59,
-        58,
-        43,
-        52,
-        48,
-        64,
-        28,
-        41,
-        29,
-        53,
-        31,
-        30,
-        78,
-        44,
-        83,
-        42,
-        79,
-        82,
-        81,
-        23,
-        45,
-        89,
-        62,
-        49,
-        60,
-        76,
-        88,
-        51,
-        37,
-        50,
-        15,
-    },
-    "ship": {7, 8, 9, 14, 19, 17, 84, 87},
-    "monkey": {
-        12,
-        69,
-        65,
-        70,
-        39,
-        71,
-        72,
-        73,
-        74,
-        75,
-        77,
-        20,
-        1,
-        2,
-        3,
-        4,
-        5,
-        6,
-        21,
-        18,
-        11,
-        16,
-        40,
-        25,
-        27,
-        80,
-    },
+MI1EGA_ROOM_CLUSTER: dict[str, frozenset[int]] = {
+    "melee": frozenset(
+        {
+            63,
+            85,
+            38,
+            33,
+            61,
+            35,
+            32,
+            34,
+            57,
+            36,
+            59,
+            58,
+            43,
+            52,
+            48,
+            64,
+            28,
+            41,
+            29,
+            53,
+            31,
+            30,
+            78,
+            44,
+            83,
+            42,
+            79,
+            82,
+            81,
+            23,
+            45,
+            89,
+            62,
+            49,
+            60,
+            76,
+            88,
+            51,
+            37,
+            50,
+            15,
+        }
+    ),
+    "ship": frozenset({7, 8, 9, 14, 19, 17, 84, 87}),
+    "monkey": frozenset(
+        {
+            12,
+            69,
+            65,
+            70,
+            39,
+            71,
+            72,
+            73,
+            74,
+            75,
+            77,
+            20,
+            1,
+            2,
+            3,
+            4,
+            5,
+            6,
+            21,
+            18,
+            11,
+            16,
+            40,
+            25,
+            27,
+            80,
+        }
+    ),
 }
 
-MI1EGA_UNUSUABLE_ROOM_LINK = [
-    (53, 36),  # foyer -> mansion-e
-]
+MI1EGA_UNUSABLE_ROOM_LINK: frozenset[tuple[int, int]] = frozenset(
+    {
+        (53, 36),  # foyer -> mansion-e
+    }
+)
+
+# opcodes which can move ego into another room
+ROOM_LINK_OPS = frozenset({"loadRoomWithEgo", "putActorInRoom"})
+
+# shared by every patched-out instruction; nops are never modified after
+# insertion (instr_list_to_bytes skips zero-offset jumps), so one is enough
+NOP = nop()
 
 IScriptType = Literal["object", "local", "global"]
 
@@ -214,8 +233,16 @@ def find_room_links(
     verb_id: int | None,
     instr_list: list[IDisassembly],
 ) -> list[IRoomLink]:
+    closeup = MI1EGA_ROOM_CLASS["closeup"]
+    card = MI1EGA_ROOM_CLASS["card"]
+    # closeups and cards never link out to other rooms
+    if room_id in closeup or room_id in card:
+        return []
+
     result: list[IRoomLink] = []
     for i, (off, x) in enumerate(instr_list):
+        if x.name not in ROOM_LINK_OPS:
+            continue
         target = x.args.get("room")
         if not isinstance(target, int):
             continue
@@ -225,13 +252,9 @@ def find_room_links(
             continue
         if target >= 200:
             continue
-        if room_id in MI1EGA_ROOM_CLASS["closeup"]:
-            return []
-        if target in MI1EGA_ROOM_CLASS["closeup"]:
+        if target in closeup:
             continue
-        if room_id in MI1EGA_ROOM_CLASS["card"]:
-            return []
-        if target in MI1EGA_ROOM_CLASS["card"]:
+        if target in card:
             continue
         if x.name == "loadRoomWithEgo":
             result.append(
@@ -288,27 +311,31 @@ def find_room_links(
 def generate_room_links(
     archives: dict[str, Any],
     content: IGameData,
+    verbose: bool = False,
 ) -> list[IRoomLink]:
     result: list[IRoomLink] = []
 
     for room_id, room in content.items():
         for obj_id, obj in room["objects"].items():
             for verb_id, verb in obj["verbs"].items():
-                for match in find_room_links(room_id, "object", obj_id, verb_id, verb):
-                    result.append(match)
+                result.extend(find_room_links(room_id, "object", obj_id, verb_id, verb))
         for local_id, local in room["locals"].items():
-            for match in find_room_links(
-                room_id, "local", local_id, None, local["script"]
-            ):
-                result.append(match)
+            result.extend(
+                find_room_links(room_id, "local", local_id, None, local["script"])
+            )
     #        for global_id, glob in room["globals"].items():
     #            for match in find_room_links(room_id, "global", global_id, None, glob['script']):
     #               result.append(match)
-    # ROOM_NAMES = get_room_names(archives)
-    # for x in sorted(result, key=lambda x: (x["source"]["room"], x["target"]["room"])):
-    #    print(
-    #        ROOM_NAMES.get(x["source"]["room"]), ROOM_NAMES.get(x["target"]["room"]), x
-    #    )
+    if verbose and result:
+        room_names = get_room_names(archives)
+        report = [
+            f"{room_names.get(x['source']['room'])} {room_names.get(x['target']['room'])} {x}"
+            for x in sorted(
+                result, key=lambda x: (x["source"]["room"], x["target"]["room"])
+            )
+        ]
+        # one write for the whole report rather than a print per link
+        print("\n".join(report))
     return result
 
 
@@ -318,22 +345,36 @@ def find_link(links: list[IRoomLink], room: int, obj: int) -> list[IRoomLink]:
     ]
 
 
-def find_link_inverse(links: list[IRoomLink], room: int, obj: int) -> list[IRoomLink]:
-    sources = [
-        l for l in links if l["source"]["room"] == room and l["source"]["id"] == obj
-    ]
+def index_links(links: list[IRoomLink]) -> dict[tuple[int, int], list[IRoomLink]]:
+    # same grouping as find_link, keyed by (room, obj). link sources never
+    # change during a shuffle, only targets do, so the index stays valid.
+    result: defaultdict[tuple[int, int], list[IRoomLink]] = defaultdict(list)
+    for l in links:
+        result[(l["source"]["room"], l["source"]["id"])].append(l)
+    return result
+
+
+def index_local_links(links: list[IRoomLink]) -> dict[int, list[IRoomLink]]:
+    # links from local scripts, keyed by source room
+    result: defaultdict[int, list[IRoomLink]] = defaultdict(list)
+    for l in links:
+        if l["source"]["type"] == "local":
+            result[l["source"]["room"]].append(l)
+    return result
+
+
+def find_link_inverse(
+    link_index: dict[tuple[int, int], list[IRoomLink]],
+    local_index: dict[int, list[IRoomLink]],
+    room: int,
+    obj: int,
+) -> list[IRoomLink]:
     result: list[IRoomLink] = []
     # find reverse matches for object id
-    for x in sources:
-        result.extend(find_link(links, x["target"]["room"], x["target"]["id"]))
+    for x in link_index.get((room, obj), []):
+        result.extend(link_index.get((x["target"]["room"], x["target"]["id"]), []))
         # sometimes the game will reference a room from a script
-        for link in [
-            y
-            for y in links
-            if y["source"]["room"] == x["target"]["room"]
-            and y["source"]["type"] == "local"
-        ]:
-            result.append(link)
+        result.extend(local_index.get(x["target"]["room"], []))
     return result
 
 
@@ -345,37 +386,52 @@ def find_link_room(links: list[IRoomLink], room_a: int, room_b: int) -> list[IRo
     ]
 
 
-def find_room_cluster(links: list[IRoomLink], start_room: int) -> set[int]:
+def generate_room_linkmap(links: list[IRoomLink]) -> dict[int, set[int]]:
+    room_linkmap: defaultdict[int, set[int]] = defaultdict(set)
+    for link in links:
+        room_linkmap[link["source"]["room"]].add(link["target"]["room"])
+    return room_linkmap
 
-    result = set()
 
-    def find_rooms(key):
-        for link in [x for x in links if x["source"]["room"] == key]:
-            target = link["target"]["room"]
+def find_room_cluster(
+    links: list[IRoomLink],
+    start_room: int,
+    room_linkmap: dict[int, set[int]] | None = None,
+) -> set[int]:
+    if room_linkmap is None:
+        room_linkmap = generate_room_linkmap(links)
+
+    result: set[int] = set()
+    rooms_to_test = [start_room]
+    while rooms_to_test:
+        key = rooms_to_test.pop()
+        for target in room_linkmap.get(key, ()):
             if target not in result:
                 result.add(target)
-                find_rooms(target)
-
-    find_rooms(start_room)
+                rooms_to_test.append(target)
     return result
 
 
 def write_changes_from_links(
     archives: dict[str, Any], scripts: IGameData, links: list[IRoomLink]
 ):
+    update_model = {
+        "object": update_object_model,
+        "local": update_local_model,
+    }
+    # a script can be the source of several links, only rebuild it once
+    dirty: dict[tuple[IScriptType, int, int], None] = {}
     for link in links:
-        if link["source"]["type"] == "object":
-            update_object_model(
-                archives, scripts, link["source"]["room"], link["source"]["id"]
-            )
-        elif link["source"]["type"] == "local":
-            update_local_model(
-                archives, scripts, link["source"]["room"], link["source"]["id"]
-            )
-        elif link["source"]["type"] == "global":
-            update_global_model(
-                archives, scripts, link["source"]["room"], link["source"]["id"]
-            )
+        source = link["source"]
+        dirty[(source["type"], source["room"], source["id"])] = None
+    for script_type, room_id, script_id in dirty:
+        if script_type == "global":
+            # globals are serialised once by save_all
+            mark_global_dirty(scripts, room_id, script_id)
+            continue
+        update = update_model.get(script_type)
+        if update is not None:
+            update(archives, scripts, room_id, script_id)
 
 
 def get_code(content: IGameData, link: IRoomLink) -> list[IDisassembly]:
@@ -590,10 +646,11 @@ def shuffle_rooms(
     print_all: bool = False,
     output_maps: pathlib.Path | None = None,
 ):
-    room_names = get_room_names(archives)
-    links = generate_room_links(archives, content)
+    room_names = get_room_names(archives) if output_maps else {}
+    links = generate_room_links(archives, content, verbose=print_all)
     start_room = 33
-    room_cluster = find_room_cluster(links, start_room)
+    room_linkmap = generate_room_linkmap(links)
+    room_cluster = find_room_cluster(links, start_room, room_linkmap=room_linkmap)
     room_links = [x for x in links if x["code_room"] in room_cluster]
     # exclude the one-way link to get to the dock from the map
     room_links = [
@@ -627,9 +684,7 @@ def shuffle_rooms(
     #   - pick an exit, connect it up
     #   - after connecting a hub room, add the unbound exits to the randomiser
     # - when no hub rooms left, go through remainder and hook up dead ends
-    dest_rooms = lambda r: {
-        x["target"]["room"] for x in links if r == x["source"]["room"]
-    }
+    dest_rooms = lambda r: room_linkmap.get(r, set())
 
     hubs = {
         k: v
@@ -642,46 +697,36 @@ def shuffle_rooms(
         if len(dest_rooms(k)) == 1 and k in room_cluster
     }
 
-    nodes = set(room_cluster)
-    nodes_to_test = {start_room}
-    nodes_done = set()
-    edges = set()
-    while nodes_to_test:
-        node = nodes_to_test.pop()
-        nodes_done.add(node)
-        link_subset = [x for x in room_links if x["source"]["room"] == node]
-        dest = {
-            x["target"]["room"]
-            for x in link_subset
-            if x["target"]["room"] not in nodes_done
-        }
-        edges.update([(node, x) for x in dest])
-        nodes_to_test.update(dest)
-
-    # import pdb; pdb.set_trace()
-
     start_hub = hubs.pop(start_room)
     edges_left = sorted((start_room, x) for x in start_hub)
+    # kept in step with hubs so picking one doesn't copy the keys each time
+    hub_ids = list(hubs)
 
+    link_index = index_links(room_links)
+    local_index = index_local_links(room_links)
     links_to_write: list[IRoomLink] = []
 
     count = 0
     while edges_left:
-        orig_edge = random.choice(edges_left)
-        edges_left.remove(orig_edge)
+        # pop(randrange()) draws the same index as random.choice(), so a given
+        # seed still produces the same shuffle
+        orig_edge = edges_left.pop(random.randrange(len(edges_left)))
         if print_all:
             print(f"--- orig_edge: {orig_edge}, edges_left: {edges_left}")
         if hubs:
-            hub_id = random.choice(list(hubs.keys()))
+            hub_id = hub_ids.pop(random.randrange(len(hub_ids)))
             hub = hubs.pop(hub_id)
 
             hub_edges = [(hub_id, h) for h in hub]
-            new_edge = random.choice(hub_edges)
-            hub_edges.remove(new_edge)
-            orig_link = find_link(room_links, orig_edge[0], orig_edge[1])
-            hub_link = find_link(room_links, new_edge[0], new_edge[1])
-            orig_link_end = find_link_inverse(room_links, orig_edge[0], orig_edge[1])
-            hub_link_end = find_link_inverse(room_links, new_edge[0], new_edge[1])
+            new_edge = hub_edges.pop(random.randrange(len(hub_edges)))
+            orig_link = link_index.get(orig_edge, [])
+            hub_link = link_index.get(new_edge, [])
+            orig_link_end = find_link_inverse(
+                link_index, local_index, orig_edge[0], orig_edge[1]
+            )
+            hub_link_end = find_link_inverse(
+                link_index, local_index, new_edge[0], new_edge[1]
+            )
             # orig_link_end = find_link_room(room_links, orig_link[0]["target"]["room"], orig_link[0]["source"]["room"])
             # hub_link_end = find_link_room(room_links, hub_link[0]["target"]["room"], hub_link[0]["source"]["room"])
 
@@ -695,7 +740,7 @@ def shuffle_rooms(
                 [*orig_link, *hub_link, *hub_link_end, *orig_link_end]
             )
             # for hl in list(hub_edges):
-            #    if (hl[1], hl[0]) in MI1EGA_UNUSUABLE_ROOM_LINK or (
+            #    if (hl[1], hl[0]) in MI1EGA_UNUSABLE_ROOM_LINK or (
             #        hl[1],
             #        hl[0],
             #    ) == (hub_link[0]["source"]["room"], hub_link[0]["source"]["id"]):
@@ -707,7 +752,7 @@ def shuffle_rooms(
             edges_left.extend(hub_edges)
         elif dead_ends:
             break
-            orig_link = find_link(room_links, orig_edge[0], orig_edge[1])
+            orig_link = link_index.get(orig_edge, [])
             dead_end_options = [
                 x for x in dead_ends.keys() if x != orig_link[0]["target"]["room"]
             ]
@@ -716,18 +761,19 @@ def shuffle_rooms(
             dead_end_room = random.choice(dead_end_options)
             dead_end_id = dead_ends.pop(dead_end_room).pop()
 
-            dead_end_link = find_link(room_links, dead_end_room, dead_end_id)
+            dead_end_link = link_index.get((dead_end_room, dead_end_id), [])
 
-            orig_link_end = find_link_inverse(room_links, orig_edge[0], orig_edge[1])
+            orig_link_end = find_link_inverse(
+                link_index, local_index, orig_edge[0], orig_edge[1]
+            )
             dead_end_link_end = find_link_inverse(
-                room_links, dead_end_room, dead_end_id
+                link_index, local_index, dead_end_room, dead_end_id
             )
 
             # print(orig_link)
             # print(dead_end_link)
             # print(orig_link_end)
             # print(dead_end_link_end)
-            #            import pdb; pdb.set_trace()
 
             exchange_multilinks(content, orig_link, dead_end_link_end)
             exchange_multilinks(content, dead_end_link, orig_link_end)
@@ -767,16 +813,14 @@ def fix_high_street(archives: dict[str, Any], content: IGameData):
             and instr.args["b"] == 38
         ):
             # because this is in a big pile of ifs, it's easier to keep the indexes
-            src[i] = (src[i][0], nop())
-            src[i + 1] = (src[i + 1][0], nop())
-            src[i + 2] = (src[i + 2][0], nop())
+            src[i : i + 3] = [(off, NOP) for off, _ in src[i : i + 3]]
             modded = True
             break
 
     # it also makes the screen scroll, which we don't want
     for i, (_, instr) in enumerate(src):
         if instr.name == "roomOps" and instr.args["op"] == "SO_ROOM_SCROLL":
-            src[i] = (src[i][0], nop())
+            src[i] = (src[i][0], NOP)
             modded = True
 
     if modded:
@@ -818,7 +862,7 @@ def fix_bridge_on_map(archives: dict[str, Any], content: IGameData):
     modded = False
     for i, (_, instr) in enumerate(src):
         if instr.name == "startScript" and instr.args["script"] == 200:
-            src[i] = (src[i][0], nop())
+            src[i] = (src[i][0], NOP)
             modded = True
 
     if modded:
@@ -835,12 +879,7 @@ def fix_damn_forest_block(archives: dict[str, Any], content: IGameData):
     modded = False
     for i, (_, instr) in enumerate(src):
         if instr.name == "getObjectOwner" and instr.args["obj"] == 449:
-            src[i] = (src[i][0], nop())
-            src[i + 1] = (src[i + 1][0], nop())
-            src[i + 2] = (src[i + 2][0], nop())
-            src[i + 3] = (src[i + 3][0], nop())
-            src[i + 4] = (src[i + 4][0], nop())
-            src[i + 5] = (src[i + 5][0], nop())
+            src[i : i + 6] = [(off, NOP) for off, _ in src[i : i + 6]]
             modded = True
             break
 
@@ -852,15 +891,7 @@ def fix_damn_forest_block(archives: dict[str, Any], content: IGameData):
     modded = False
     for i, (_, instr) in enumerate(src):
         if instr.name == "getObjectOwner" and instr.args["obj"] == 449:
-            src[i] = (src[i][0], nop())
-            src[i + 1] = (src[i + 1][0], nop())
-            src[i + 2] = (src[i + 2][0], nop())
-            src[i + 3] = (src[i + 3][0], nop())
-            src[i + 4] = (src[i + 4][0], nop())
-            src[i + 5] = (src[i + 5][0], nop())
-            src[i + 6] = (src[i + 5][0], nop())
-            src[i + 7] = (src[i + 5][0], nop())
-            src[i + 8] = (src[i + 5][0], nop())
+            src[i : i + 9] = [(off, NOP) for off, _ in src[i : i + 9]]
             modded = True
             break
 
@@ -889,8 +920,6 @@ def find_forest_links(
         _, w = instr_list[off]
         if w.name == "isEqual" and w.args["a"] == V4Var(4, None):
             src_room = w.args["b"]
-            # if src_room == 215:
-            #    import pdb; pdb.set_trace()
             off += 1
             while off < len(instr_list):
                 _, x = instr_list[off]
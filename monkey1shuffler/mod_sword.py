@@ -4,7 +4,7 @@ import random
 from typing import Any
 
 from .disasm import scumm_v4_tokenizer
-from .resources import IGameData, get_global_model, update_global_model
+from .resources import IGameData, get_global_model, mark_global_dirty
 
 
 def non_sequitur_swordfighting(archives: dict[str, Any], content: IGameData, shuffle_order: bool) -> None:
@@ -13,34 +13,33 @@ def non_sequitur_swordfighting(archives: dict[str, Any], content: IGameData, shu
     INSULT_SHISH = 1
 
     fight_room = content[88]
-    jab_ids = [i for i in range(INSULT_COUNT)]
-    retort_ids = [i for i in range(INSULT_COUNT)]
+    jab_ids = list(range(INSULT_COUNT))
+    retort_ids = list(range(INSULT_COUNT))
     if shuffle_order:
         random.shuffle(jab_ids)
     random.shuffle(retort_ids)
 
     jab_script = fight_room["globals"][82]["script"]
     retort_script = fight_room["globals"][83]["script"]
-    jabs = [
-        jab_script[2 + 3 * i][1].args["args"]["string"][0].data
-        for i in range(INSULT_COUNT)
-    ]
-    sm_jabs = [
-        jab_script[50 + 3 * i][1].args["args"]["string"][0].data
-        for i in range(INSULT_COUNT)
-    ]
-    retorts = [
-        retort_script[2 + 3 * i][1].args["args"]["string"][0].data
-        for i in range(INSULT_COUNT)
-    ]
-    for i, x in enumerate(jab_ids):
-        jab_script[2 + 3 * i][1].args["args"]["string"][0].data = jabs[x]
-        jab_script[50 + 3 * i][1].args["args"]["string"][0].data = sm_jabs[x]
-    for i, x in enumerate(retort_ids):
-        retort_script[2 + 3 * i][1].args["args"]["string"][0].data = retorts[x]
+    # walk to each string token once, then reuse it for both the read and the write
+    jab_tokens = []
+    sm_jab_tokens = []
+    retort_tokens = []
+    for i in range(INSULT_COUNT):
+        jab_tokens.append(jab_script[2 + 3 * i][1].args["args"]["string"][0])
+        sm_jab_tokens.append(jab_script[50 + 3 * i][1].args["args"]["string"][0])
+        retort_tokens.append(retort_script[2 + 3 * i][1].args["args"]["string"][0])
+    jabs = [x.data for x in jab_tokens]
+    sm_jabs = [x.data for x in sm_jab_tokens]
+    retorts = [x.data for x in retort_tokens]
+    for jab, sm_jab, x in zip(jab_tokens, sm_jab_tokens, jab_ids):
+        jab.data = jabs[x]
+        sm_jab.data = sm_jabs[x]
+    for retort, x in zip(retort_tokens, retort_ids):
+        retort.data = retorts[x]
 
-    update_global_model(archives, content, 88, 82)
-    update_global_model(archives, content, 88, 83)
+    mark_global_dirty(content, 88, 82)
+    mark_global_dirty(content, 88, 83)
 
     convo_script = fight_room["globals"][79]["script"]
     convo_script[10][1].args["ops"][0][1]["str"][
@@ -52,44 +51,36 @@ def non_sequitur_swordfighting(archives: dict[str, Any], content: IGameData, shu
     convo_script[25][1].args["args"]["string"][
         0
     ].data = b"That's not fair, you're using the Sword Master's non-sequiturs, I see."
-    update_global_model(archives, content, 88, 79)
+    mark_global_dirty(content, 88, 79)
 
     smirk_room = content[43]
-    training = smirk_room["globals"][57]
-    training["script"][513][1].args["ops"][0][1]["str"][
-        0
-    ].data = b"^they know just when to throw their opponent with a non-sequitur^"
-    training["script"][517][1].args["ops"][0][1]["str"][
-        0
-    ].data = b"Let's try a couple of non-sequiturs out, shall we?"
-    training["script"][521][1].args["ops"][0][1]["str"][0].data = (
-        b"^'" + jabs[jab_ids[INSULT_FARMER]] + b"'"
-    )
-    training["script"][543][1].args["ops"][1][1]["text"][0].data = retorts[
-        jab_ids[INSULT_FARMER]
-    ]
-    training["script"][558][1].args["ops"][0][1]["str"][2].data = (
-        b"^'" + retorts[retort_ids[INSULT_FARMER]] + b"'"
-    )
-    training["script"][567][1].args["ops"][0][1]["str"][0].data = (
-        b"^'" + jabs[jab_ids[INSULT_SHISH]] + b"'"
-    )
-    training["script"][591][1].args["ops"][1][1]["text"][0].data = retorts[
-        retort_ids[INSULT_FARMER]
-    ]
-    training["script"][612][1].args["ops"][0][1]["str"][
-        2
-    ].data = b"That was the response from the last non-sequitur."
-    training["script"][619][1].args["ops"][0][1]["str"][2].data = (
-        b"^'" + jabs[jab_ids[INSULT_SHISH]] + b"'^"
-    )
-    training["script"][622][1].args["ops"][0][1]["str"][0].data = (
-        b"^'" + retorts[retort_ids[INSULT_SHISH]] + b"'"
+    training = smirk_room["globals"][57]["script"]
+
+    def set_str(n: int, sub: int, data: bytes) -> None:
+        training[n][1].args["ops"][0][1]["str"][sub].data = data
+
+    def set_text(n: int, data: bytes) -> None:
+        training[n][1].args["ops"][1][1]["text"][0].data = data
+
+    farmer_jab = jabs[jab_ids[INSULT_FARMER]]
+    farmer_retort = retorts[retort_ids[INSULT_FARMER]]
+    shish_jab = jabs[jab_ids[INSULT_SHISH]]
+    shish_retort = retorts[retort_ids[INSULT_SHISH]]
+
+    set_str(
+        513, 0, b"^they know just when to throw their opponent with a non-sequitur^"
     )
-    training["script"][626][1].args["ops"][0][1]["str"][
-        0
-    ].data = b"Now I suggest you go out there and learn some non-sequiturs."
-    update_global_model(archives, content, 43, 57)
+    set_str(517, 0, b"Let's try a couple of non-sequiturs out, shall we?")
+    set_str(521, 0, b"^'" + farmer_jab + b"'")
+    set_text(543, retorts[jab_ids[INSULT_FARMER]])
+    set_str(558, 2, b"^'" + farmer_retort + b"'")
+    set_str(567, 0, b"^'" + shish_jab + b"'")
+    set_text(591, farmer_retort)
+    set_str(612, 2, b"That was the response from the last non-sequitur.")
+    set_str(619, 2, b"^'" + shish_jab + b"'^")
+    set_str(622, 0, b"^'" + shish_retort + b"'")
+    set_str(626, 0, b"Now I suggest you go out there and learn some non-sequiturs.")
+    mark_global_dirty(content, 43, 57)
 
     #print("\nAfter:")
     #model = get_global_model(archives, content, 43, 57)
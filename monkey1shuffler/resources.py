@@ -1,10 +1,12 @@
 from __future__ import annotations
 
+import functools
 import pathlib
-from typing import Any, TypedDict
+from collections import defaultdict
+from collections.abc import Iterator
+from typing import Any, NotRequired, TypedDict
 
 from mrcrowbar import models as mrc
-from mrcrowbar import utils
 from mrcrowbar.common import BytesReadType
 from mrcrowbar.transforms import TransformResult
 
@@ -127,23 +129,36 @@ class LEC(mrc.Block):
     )
 
 
+# bytes.translate tables for single-byte XOR, shared between every user of a key
+_XOR_TABLES: dict[int, bytes] = {}
+
+
+def get_xor_table(secret: int) -> bytes:
+    table = _XOR_TABLES.get(secret)
+    if table is None:
+        table = bytes(x ^ secret for x in range(256))
+        _XOR_TABLES[secret] = table
+    return table
+
+
 class XORBytes(mrc.Transform):
     def __init__(self, secret, *args, **kwargs):
         self.secret = secret
+        self.table = get_xor_table(secret)
         super().__init__(*args, **kwargs)
 
     def import_data(
         self, buffer: BytesReadType, parent: mrc.Block | None = None
     ) -> TransformResult:
         return TransformResult(
-            payload=bytes([x ^ self.secret for x in buffer]), end_offset=len(buffer)
+            payload=bytes(buffer).translate(self.table), end_offset=len(buffer)
         )
 
     def export_data(
         self, buffer: BytesReadType, parent: mrc.Block | None = None
     ) -> TransformResult:
         return TransformResult(
-            payload=bytes([x ^ self.secret for x in buffer]), end_offset=len(buffer)
+            payload=bytes(buffer).translate(self.table), end_offset=len(buffer)
         )
 
 
@@ -182,19 +197,27 @@ class LFL(mrc.Block):
     )
 
 
+# the LEC archives are XORed with 0x69; bytes.translate applies this in C
+LEC_XOR_TABLE = get_xor_table(0x69)
+
+
 def get_archives(path: pathlib.Path) -> dict[str, Any]:
     result = {}
     for arch in ["DISK01.LEC", "DISK02.LEC", "DISK03.LEC", "DISK04.LEC"]:
         with open(path / arch, "rb") as file:
-            f = bytearray(x ^ 0x69 for x in file.read())
+            f = file.read().translate(LEC_XOR_TABLE)
 
         # for some reason, DISK01.LEC has an invalid chunk size for the sound block in room 10.
         # fix it manually before loading.
         if arch == "DISK01.LEC":
-            bodge = utils.find(b"\x15\x82\x00\x00SO--", f)
-            if bodge:
-                f[bodge[0][0] : bodge[0][0] + 4] = utils.to_uint32_le(0x8115)
-        f = bytes(f)
+            bodge = f.find(b"\x15\x82\x00\x00SO--")
+            if bodge != -1:
+                # splice in the fixed size with a single copy of the archive,
+                # rather than copying to a bytearray and back
+                view = memoryview(f)
+                f = b"".join(
+                    (view[:bodge], (0x8115).to_bytes(4, "little"), view[bodge + 4 :])
+                )
         print(f"Parsing {arch} ({len(f)} bytes)...")
         result[arch] = LEC(f, strict=True)
     with open(path / "000.LFL", "rb") as file:
@@ -211,14 +234,37 @@ def get_room_names(archives: dict[str, Any]) -> dict[int, str]:
     }
 
 
+IGlobalMap = dict[tuple[int, int], int]
+IGlobalMaps = tuple[IGlobalMap, IGlobalMap, IGlobalMap]
+
+
+def get_global_maps(archives: dict[str, Any]) -> IGlobalMaps:
+    # (room, chunk offset) -> global id lookups for the 0S, 0N and 0C tables
+    script_items, sound_items, costume_items = (
+        archives["000.LFL"].chunks[n].obj.items for n in (2, 3, 4)
+    )
+    return (
+        {(gi.room_id, gi.offset + 2): i for i, gi in enumerate(script_items)},
+        {(gi.room_id, gi.offset + 2): i for i, gi in enumerate(sound_items)},
+        {(gi.room_id, gi.offset + 2): i for i, gi in enumerate(costume_items)},
+    )
+
+
+def iter_room_chunks(disk: mrc.Block) -> Iterator[tuple[int, int, mrc.Chunk]]:
+    # yields the LF chunk for every room in a LEC archive, with its (LE, LF) index
+    for i, le in enumerate(disk.chunks):
+        if le.id != b"LE":
+            continue
+        for j, lf in enumerate(le.obj.chunks):
+            if lf.id == b"LF":
+                yield i, j, lf
+
+
 def get_object_names(archives: dict[str, Any]) -> dict[int, str]:
     return {
         oc.obj.id: oc.obj.name
         for disk in archives.values()
-        for le in disk.chunks
-        if le.id == b"LE"
-        for lf in le.obj.chunks
-        if lf.id == b"LF"
+        for _, _, lf in iter_room_chunks(disk)
         for ro in lf.obj.chunks
         if ro.id == b"RO"
         for oc in ro.obj.chunks
@@ -232,6 +278,7 @@ IDisassembly = tuple[int, V4Instr]
 class IGlobalData(TypedDict):
     index: int
     script: list[IDisassembly]
+    dirty: NotRequired[bool]
 
 
 class IObjectData(TypedDict):
@@ -282,159 +329,129 @@ IGameData = dict[int, IRoomData]
 def dump_all(archives: dict[str, Any], print_data: bool = False) -> IGameData:
     results: dict[int, IRoomData] = {}
     ROOM_NAMES = get_room_names(archives)
-    GLOBAL_SCRIPT_MAP: dict[tuple[int, int], int] = {
-        (gi.room_id, gi.offset + 2): i
-        for i, gi in enumerate(archives["000.LFL"].chunks[2].obj.items)
-    }
-
-    GLOBAL_SOUND_MAP: dict[tuple[int, int], int] = {
-        (gi.room_id, gi.offset + 2): i
-        for i, gi in enumerate(archives["000.LFL"].chunks[3].obj.items)
-    }
-
-    GLOBAL_COSTUME_MAP: dict[tuple[int, int], int] = {
-        (gi.room_id, gi.offset + 2): i
-        for i, gi in enumerate(archives["000.LFL"].chunks[4].obj.items)
-    }
+    GLOBAL_SCRIPT_MAP, GLOBAL_SOUND_MAP, GLOBAL_COSTUME_MAP = get_global_maps(archives)
+    # every whole-chunk script (global, local, entry, exit) is disassembled the same way
+    tokenize_script = functools.partial(
+        scumm_v4_tokenizer,
+        offset=0,
+        dump_all=True,
+        print_data=print_data,
+        print_prefix="    ",
+    )
 
     for key in ["DISK01.LEC", "DISK02.LEC", "DISK03.LEC", "DISK04.LEC"]:
         disk = archives[key]
         if print_data:
             print(f"- {key}")
-        for i, le in enumerate(disk.chunks):
-            if le.id != b"LE":
-                continue
-            for j, lf in enumerate(le.obj.chunks):
-                if lf.id != b"LF":
-                    continue
-                results[lf.obj.id] = {
-                    "name": ROOM_NAMES.get(lf.obj.id),
-                    "archive": key,
-                    "index": (i, j),
-                    "globals": {},
-                    "objects": {},
-                    "locals": {},
-                    "costumes": {},
-                    "sounds": {},
-                }
-                if print_data:
-                    print(f"  - room {lf.obj.id} ({ROOM_NAMES.get(lf.obj.id)})")
-                for k, ro in enumerate(lf.obj.chunks):
-                    if ro.id == b"SC":
-                        global_idx = (
-                            lf.obj.id,
-                            lf.obj.get_field_start_offset("chunks", k),
+        for i, j, lf in iter_room_chunks(disk):
+            room_id = lf.obj.id
+            room_name = ROOM_NAMES.get(room_id)
+            room: IRoomData = {
+                "name": room_name,
+                "archive": key,
+                "index": (i, j),
+                "globals": {},
+                "objects": {},
+                "locals": {},
+                "costumes": {},
+                "sounds": {},
+            }
+            results[room_id] = room
+            if print_data:
+                print(f"  - room {room_id} ({room_name})")
+            chunk_starts = get_chunk_offsets(lf.obj)
+            for k, ro in enumerate(lf.obj.chunks):
+                if ro.id == b"SC":
+                    global_idx = (room_id, chunk_starts[k])
+                    global_id = GLOBAL_SCRIPT_MAP.get(global_idx)
+                    if global_id is None:
+                        print(f"WARNING: could not find global matching {global_idx}")
+                        continue
+                    if print_data:
+                        print(
+                            f"    - global script {global_id} ({len(ro.obj.data)} bytes)"
                         )
-                        global_id = GLOBAL_SCRIPT_MAP.get(global_idx)
-                        if global_id is None:
+                    room["globals"][global_id] = {
+                        "index": k,
+                        "script": tokenize_script(ro.obj.data),
+                    }
+                    continue
+                elif ro.id == b"CO":
+                    costume_idx = (room_id, chunk_starts[k])
+                    costume_id = GLOBAL_COSTUME_MAP[costume_idx]
+                    room["costumes"][costume_id] = {"index": k}
+                    continue
+                elif ro.id == b"SO":
+                    sound_idx = (room_id, chunk_starts[k])
+                    sound_id = GLOBAL_SOUND_MAP[sound_idx]
+                    room["sounds"][sound_id] = {"index": k}
+                    continue
+                elif ro.id != b"RO":
+                    continue
+                for l, o in enumerate(ro.obj.chunks):
+                    if o.id == b"OC":
+                        if print_data:
                             print(
-                                f"WARNING: could not find global matching {global_idx}"
+                                f"    - object script {o.obj.id} ({o.obj.name}) ({len(o.obj.events)} events, {len(o.obj.data)} bytes)"
                             )
-                            continue
+                        verbs: dict[int, list[IDisassembly]] = {}
+                        room["objects"][o.obj.id] = {
+                            "name": o.obj.name,
+                            "index": (k, l),
+                            "verbs": verbs,
+                        }
+                        data = o.obj.data
+                        start_offset = o.obj.get_field_start_offset("data") + 6
+                        for ev in o.obj.events:
+                            verb_name = V4_VERBS.get(ev.verb_id)
+                            if print_data:
+                                print(f"        - verb {ev.verb_id} ({verb_name})")
+                            verbs[ev.verb_id] = scumm_v4_tokenizer(
+                                data,
+                                ev.code_offset - start_offset,
+                                dump_all=False,
+                                print_offset=start_offset,
+                                print_data=print_data,
+                                print_prefix="        ",
+                            )
+                    elif o.id == b"LS":
                         if print_data:
                             print(
-                                f"    - global script {global_id} ({len(ro.obj.data)} bytes)"
+                                f"    - local script {o.obj.id} ({len(o.obj.data)} bytes)"
                             )
-                        results[lf.obj.id]["globals"][global_id] = {
-                            "index": k,
-                            "script": scumm_v4_tokenizer(
-                                ro.obj.data,
-                                0,
-                                dump_all=True,
-                                print_data=print_data,
-                                print_prefix="    ",
-                            ),
+
+                        room["locals"][o.obj.id] = {
+                            "index": (k, l),
+                            "script": tokenize_script(o.obj.data),
+                        }
+                    elif o.id == b"EN":
+                        if print_data:
+                            print(f"    - entry script ({len(o.obj.data)} bytes)")
+                        room["entry"] = {
+                            "index": (k, l),
+                            "script": tokenize_script(o.obj.data),
+                        }
+                    elif o.id == b"EX":
+                        if print_data:
+                            print(f"    - exit script ({len(o.obj.data)} bytes)")
+                        room["exit"] = {
+                            "index": (k, l),
+                            "script": tokenize_script(o.obj.data),
                         }
-                        continue
-                    elif ro.id == b"CO":
-                        costume_idx = (
-                            lf.obj.id,
-                            lf.obj.get_field_start_offset("chunks", k),
-                        )
-                        costume_id = GLOBAL_COSTUME_MAP[costume_idx]
-                        results[lf.obj.id]["costumes"][costume_id] = {"index": k}
-                        continue
-                    elif ro.id == b"SO":
-                        sound_idx = (
-                            lf.obj.id,
-                            lf.obj.get_field_start_offset("chunks", k),
-                        )
-                        sound_id = GLOBAL_SOUND_MAP[sound_idx]
-                        results[lf.obj.id]["sounds"][sound_id] = {"index": k}
-                        continue
-                    elif ro.id != b"RO":
-                        continue
-                    for l, o in enumerate(ro.obj.chunks):
-                        if o.id == b"OC":
-                            if print_data:
-                                print(
-                                    f"    - object script {o.obj.id} ({o.obj.name}) ({len(o.obj.events)} events, {len(o.obj.data)} bytes)"
-                                )
-                            results[lf.obj.id]["objects"][o.obj.id] = {
-                                "name": o.obj.name,
-                                "index": (k, l),
-                                "verbs": {},
-                            }
-                            for ev in o.obj.events:
-                                verb_name = V4_VERBS.get(ev.verb_id)
-                                if print_data:
-                                    print(f"        - verb {ev.verb_id} ({verb_name})")
-                                start_offset = o.obj.get_field_start_offset("data") + 6
-                                results[lf.obj.id]["objects"][o.obj.id]["verbs"][
-                                    ev.verb_id
-                                ] = scumm_v4_tokenizer(
-                                    o.obj.data,
-                                    ev.code_offset - start_offset,
-                                    dump_all=False,
-                                    print_offset=start_offset,
-                                    print_data=print_data,
-                                    print_prefix="        ",
-                                )
-                        elif o.id == b"LS":
-                            if print_data:
-                                print(
-                                    f"    - local script {o.obj.id} ({len(o.obj.data)} bytes)"
-                                )
-
-                            results[lf.obj.id]["locals"][o.obj.id] = {
-                                "index": (k, l),
-                                "script": scumm_v4_tokenizer(
-                                    o.obj.data,
-                                    0,
-                                    dump_all=True,
-                                    print_data=print_data,
-                                    print_prefix="    ",
-                                ),
-                            }
-                        elif o.id == b"EN":
-                            if print_data:
-                                print(f"    - entry script ({len(o.obj.data)} bytes)")
-                            results[lf.obj.id]["entry"] = {
-                                "index": (k, l),
-                                "script": scumm_v4_tokenizer(
-                                    o.obj.data,
-                                    0,
-                                    dump_all=True,
-                                    print_data=print_data,
-                                    print_prefix="    ",
-                                ),
-                            }
-                        elif o.id == b"EX":
-                            if print_data:
-                                print(f"    - exit script ({len(o.obj.data)} bytes)")
-                            results[lf.obj.id]["exit"] = {
-                                "index": (k, l),
-                                "script": scumm_v4_tokenizer(
-                                    o.obj.data,
-                                    0,
-                                    dump_all=True,
-                                    print_data=print_data,
-                                    print_prefix="    ",
-                                ),
-                            }
     return results
 
 
+def get_chunk_offsets(block: mrc.Block) -> list[int]:
+    # equivalent to calling get_field_start_offset("chunks", i) for every chunk,
+    # but in one pass instead of re-measuring all the preceding chunks each time
+    result = []
+    pointer = block.get_field_start_offset("chunks")
+    for i in range(len(block.chunks)):
+        result.append(pointer)
+        pointer += block.get_field_size("chunks", i)
+    return result
+
+
 def get_room_model(archives: dict[str, Any], scripts: IGameData, room_id: int):
     room = scripts[room_id]
     room_model = (
@@ -470,7 +487,17 @@ def get_global_model(
     return room_model.chunks[src["index"]].obj
 
 
-def update_global_model(
+def mark_global_dirty(scripts: IGameData, room_id: int, script_id: int):
+    """Flag a global script to be serialised once by save_all.
+
+    Several mods rewrite the same global (e.g. the boot script). Unlike the
+    update_*_model helpers, this doesn't touch the model, so its .data keeps
+    the old bytes until save_all (or flush_global_model) runs.
+    """
+    scripts[room_id]["globals"][script_id]["dirty"] = True
+
+
+def flush_global_model(
     archives: dict[str, Any], scripts: IGameData, room_id: int, script_id: int
 ):
     src = scripts[room_id]["globals"][script_id]
@@ -496,16 +523,22 @@ def update_object_model(
     src = scripts[room_id]["objects"][object_id]
     object_model: OC = get_object_model(archives, scripts, room_id, object_id)
     object_model.name = src["name"]
-    object_model.events = []
-    object_model.data = b""
+    events = []
     for verb in src["verbs"].keys():
-        object_model.events.append(ObjectEvent(parent=object_model))
-        object_model.events[-1].verb_id = verb
+        event = ObjectEvent(parent=object_model)
+        event.verb_id = verb
+        events.append(event)
+    object_model.events = events
+    object_model.data = b""
     start_offset = object_model.get_field_start_offset("data") + 6
-    for i, (verb_id, code) in enumerate(src["verbs"].items()):
+    parts: list[bytes] = []
+    offset = start_offset
+    for event, code in zip(events, src["verbs"].values()):
         code_data = instr_list_to_bytes(code)
-        object_model.events[i].code_offset = len(object_model.data) + start_offset
-        object_model.data += code_data
+        event.code_offset = offset
+        parts.append(code_data)
+        offset += len(code_data)
+    object_model.data = b"".join(parts)
 
 
 def get_entry_model(archives: dict[str, Any], scripts: IGameData, room_id: int):
@@ -542,19 +575,33 @@ def save_all(
     path: pathlib.Path,
     print_all: bool = False,
 ) -> None:
+    for room_id, room in content.items():
+        for global_id, glob in room["globals"].items():
+            if glob.pop("dirty", False):
+                flush_global_model(archives, content, room_id, global_id)
+
     print(f"Updating resource offset tables in 000.LFL...")
+    lfl = archives["000.LFL"]
+    global_refs = lfl.chunks[2].obj.items
+    sound_refs = lfl.chunks[3].obj.items
+    costume_refs = lfl.chunks[4].obj.items
+    # rooms share an LE chunk, and nothing here changes chunk sizes, so
+    # measure each LE once
+    le_offsets: dict[tuple[str, int], list[int]] = {}
+    # FO entries for each archive, grouped by room
+    fo_entries: dict[str, dict[int, list[FOEntry]]] = {}
     for room_id, room in content.items():
-        room_model = (
-            archives[room["archive"]]
-            .chunks[room["index"][0]]
-            .obj.chunks[room["index"][1]]
-            .obj
-        )
+        archive_name = room["archive"]
+        le_index, lf_index = room["index"]
+        archive = archives[archive_name]
+        le_model = archive.chunks[le_index].obj
+        room_model = le_model.chunks[lf_index].obj
+        room_offsets = get_chunk_offsets(room_model)
 
         # fix up top-level offsets table in the LFL
         for global_id, glob in room["globals"].items():
-            ref = archives["000.LFL"].chunks[2].obj.items[global_id]
-            new_offset = room_model.get_field_start_offset("chunks", glob["index"]) - 2
+            ref = global_refs[global_id]
+            new_offset = room_offsets[glob["index"]] - 2
             if ref.offset != new_offset:
                 if print_all:
                     print(
@@ -563,8 +610,8 @@ def save_all(
                 ref.offset = new_offset
 
         for sound_id, sound in room["sounds"].items():
-            ref = archives["000.LFL"].chunks[3].obj.items[sound_id]
-            new_offset = room_model.get_field_start_offset("chunks", sound["index"]) - 2
+            ref = sound_refs[sound_id]
+            new_offset = room_offsets[sound["index"]] - 2
             if ref.offset != new_offset:
                 if print_all:
                     print(
@@ -573,10 +620,8 @@ def save_all(
                 ref.offset = new_offset
 
         for costume_id, costume in room["costumes"].items():
-            ref = archives["000.LFL"].chunks[4].obj.items[costume_id]
-            new_offset = (
-                room_model.get_field_start_offset("chunks", costume["index"]) - 2
-            )
+            ref = costume_refs[costume_id]
+            new_offset = room_offsets[costume["index"]] - 2
             if ref.offset != new_offset:
                 if print_all:
                     print(
@@ -585,27 +630,27 @@ def save_all(
                 ref.offset = new_offset
 
         # fix up file offsets table
-        for fo in archives[room["archive"]].chunks[0].obj.chunks[0].obj.entries:
-            if fo.room_id != room_id:
-                continue
-            new_offset = (
-                archives[room["archive"]]
-                .chunks[room["index"][0]]
-                .obj.get_field_start_offset("chunks", room["index"][1])
-                + 6
-            )
+        if archive_name not in fo_entries:
+            fo_entries[archive_name] = defaultdict(list)
+            for fo in archive.chunks[0].obj.chunks[0].obj.entries:
+                fo_entries[archive_name][fo.room_id].append(fo)
+        for fo in fo_entries[archive_name].get(room_id, []):
+            le_key = (archive_name, le_index)
+            if le_key not in le_offsets:
+                le_offsets[le_key] = get_chunk_offsets(le_model)
+            new_offset = le_offsets[le_key][lf_index] + 6
             if fo.offset != new_offset:
                 if print_all:
                     print(
-                        f"{room['archive']} FO table - room {room_id}: offset {fo.offset} -> {new_offset}"
+                        f"{archive_name} FO table - room {room_id}: offset {fo.offset} -> {new_offset}"
                     )
                 fo.offset = new_offset
 
     print("Generating new 000.LFL...")
     with open(path / f"000.LFL", "wb") as f:
-        f.write(archives["000.LFL"].export_data())
+        f.write(lfl.export_data())
 
     for k in ["DISK01.LEC", "DISK02.LEC", "DISK03.LEC", "DISK04.LEC"]:
         print(f"Generating new {k}...")
         with open(path / f"{k}", "wb") as f:
-            f.write(bytes(x ^ 0x69 for x in archives[k].export_data()))
+            f.write(archives[k].export_data().translate(LEC_XOR_TABLE))